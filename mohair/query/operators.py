@@ -29,11 +29,11 @@ Convenience classes and functions for processing relational operators.
 # Dependencies
 
 # >> Standard libs
+import sys
 import logging
 
 from typing import Any
 
-from functools import singledispatch
 from dataclasses import dataclass, field
 
 # >> Internal
@@ -44,16 +44,15 @@ from mohair import default_loglevel
 
 #   |> Substrait definitions
 #       |> relation types for common, leaf, unary, and N-ary relations
+#       (only types that are wrapped or translated; extension relations are not yet)
 from mohair.substrait.algebra_pb2 import Rel
-from mohair.substrait.algebra_pb2 import ReadRel, ExtensionLeafRel
-from mohair.substrait.algebra_pb2 import (FilterRel,  FetchRel, AggregateRel, SortRel,
-                                          ProjectRel, ExtensionSingleRel)
-from mohair.substrait.algebra_pb2 import (JoinRel, SetRel, ExtensionMultiRel,
-                                          HashJoinRel, MergeJoinRel)
+from mohair.substrait.algebra_pb2 import ReadRel
+from mohair.substrait.algebra_pb2 import FilterRel, FetchRel, AggregateRel, SortRel, ProjectRel
+from mohair.substrait.algebra_pb2 import JoinRel, SetRel, HashJoinRel, MergeJoinRel
 
 #   |> Mohair definitions
 #       |> leaf relation types
-from mohair.mohair.algebra_pb2 import SkyRel, QueryRel
+from mohair.mohair.algebra_pb2 import SkyRel
 
 
 # ------------------------------
@@ -69,13 +68,25 @@ AddConsoleLogHandler(logger)
 # Classes
 
 # >> Operator structure
+#   |> Operators only wrap a substrait message and are not modified after construction,
+#   |> so they are frozen and slotted. Plans (below) are slotted but remain mutable, since
+#   |> pipelines are extended during translation.
 
-@dataclass
-class MohairOp: pass
+@dataclass(slots=True, frozen=True, eq=False)
+class MohairOp:
+    """
+    Base class for mohair operators. Each subclass defines a `KIND` tag (a class attribute,
+    not a field) that code walking a plan can compare against instead of chaining
+    `isinstance` checks.
+    """
+
+    KIND = None
 
 #   |> Unary relational classes
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class Projection(MohairOp):
+    KIND = 'projection'
+
     plan_op: ProjectRel
 
     def __str__(self):
@@ -84,8 +95,10 @@ class Projection(MohairOp):
     def __hash__(self):
         return hash(self.__str__())
 
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class Selection(MohairOp):
+    KIND = 'selection'
+
     plan_op: FilterRel
 
     def __str__(self):
@@ -94,8 +107,10 @@ class Selection(MohairOp):
     def __hash__(self):
         return hash(self.__str__())
 
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class Aggregation(MohairOp):
+    KIND = 'aggregation'
+
     plan_op: AggregateRel
 
     def __str__(self):
@@ -104,8 +119,10 @@ class Aggregation(MohairOp):
     def __hash__(self):
         return hash(self.__str__())
 
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class Limit(MohairOp):
+    KIND = 'limit'
+
     plan_op: FetchRel
 
     def __str__(self):
@@ -114,38 +131,59 @@ class Limit(MohairOp):
     def __hash__(self):
         return hash(self.__str__())
 
+@dataclass(slots=True, frozen=True, eq=False)
+class Sort(MohairOp):
+    KIND = 'sort'
+
+    plan_op: SortRel
+
+    def __str__(self):
+        return 'Sort()'
+
+    def __hash__(self):
+        return hash(self.__str__())
+
 
 #   |> Leaf relational classes
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class Read(MohairOp):
-    plan_op: ReadRel
-    name   : str = None
+    KIND = 'read'
+
+    plan_op  : ReadRel
+    name     : str = None
+    read_type: str = field(default=None, init=False)
 
     def __post_init__(self):
+        # operators are frozen, so fields derived from plan_op are set via object
+        read_type = self.plan_op.WhichOneof('read_type')
+        object.__setattr__(self, 'read_type', read_type)
+
         # grab the name of the table; otherwise just its type for now
-        if self.plan_op.HasField('named_table'):
-            self.name = '/'.join(self.plan_op.named_table.names)
+        if read_type == 'named_table':
+            object.__setattr__(self, 'name', '/'.join(self.plan_op.named_table.names))
 
         else:
             # TODO: we will eventually want a more robust name than the type of ReadRel
-            self.name = self.plan_op.WhichOneof('read_type')
+            object.__setattr__(self, 'name', read_type)
 
     def __str__(self):
-        read_type = self.plan_op.WhichOneof('read_type')
-
-        return f'Read({read_type})'
+        return f'Read({self.read_type})'
 
     def __hash__(self):
         return hash(self.__str__())
 
 # NOTE: this should integrate a skytether partition and a SkyRel message
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class SkyPartition(MohairOp):
+    KIND = 'skypartition'
+
     plan_op: SkyRel
     name   : str = None
 
     def __post_init__(self):
-        self.name = f'{self.plan_op.domain}/{self.plan_op.partition}'
+        # many partitions share a domain, so names are interned for cheaper comparisons
+        partition_name = sys.intern(f'{self.plan_op.domain}/{self.plan_op.partition}')
+        object.__setattr__(self, 'name', partition_name)
 
     def __str__(self):
         return f'SkyPartition({self.name})'
@@ -155,8 +193,10 @@ class SkyPartition(MohairOp):
 
 
 #   |>  Concrete relational classes (joins)
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class Join(MohairOp):
+    KIND = 'join'
+
     plan_op: JoinRel
     name   : str = None
 
@@ -166,8 +206,10 @@ class Join(MohairOp):
     def __hash__(self):
         return hash(self.__str__())
 
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class HashJoin(MohairOp):
+    KIND = 'hashjoin'
+
     plan_op: HashJoinRel
 
     def __str__(self):
@@ -176,8 +218,10 @@ class HashJoin(MohairOp):
     def __hash__(self):
         return hash(self.__str__())
 
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class MergeJoin(MohairOp):
+    KIND = 'mergejoin'
+
     plan_op: MergeJoinRel
 
     def __str__(self):
@@ -188,8 +232,10 @@ class MergeJoin(MohairOp):
 
 
 #   |>  Concrete relational classes (N-ary)
-@dataclass
+@dataclass(slots=True, frozen=True, eq=False)
 class SetOp(MohairOp):
+    KIND = 'setop'
+
     plan_op: SetRel
 
     def __str__(self):
@@ -200,7 +246,7 @@ class SetOp(MohairOp):
 
 
 # >> High-level plan structure
-@dataclass
+@dataclass(slots=True)
 class MohairPlan:
 
     @classmethod
@@ -212,7 +258,7 @@ class MohairPlan:
         return plan_hash.to_bytes(width, byteorder='big', signed=signed)
 
 
-@dataclass
+@dataclass(slots=True)
 class PlanPipeline(MohairPlan):
     """
     Represents a holistic plan that has a list of pipelined ops that can be applied to the
@@ -231,15 +277,14 @@ class PlanPipeline(MohairPlan):
         return sum([hash(op) for op in self.op_pipeline])
 
     def Print(self, indent=''):
-        return (
-              f'{indent}PlanPipeline({self.name})\n'
-            + f'{indent}[' + '\n\t'.join([str(op) for op in self.op_pipeline]) + ']'
-            + f'\n{indent}|> subplans:\n'
-            + '\n'.join([
-                  subplan.Print(indent + '\t')
-                  for subplan in self.subplans
-              ])
-        )
+        plan_lines = [
+             f'{indent}PlanPipeline({self.name})'
+            ,f'{indent}[' + ', '.join(map(str, self.op_pipeline)) + ']'
+            ,f'{indent}|> subplans:'
+        ]
+        plan_lines.extend(subplan.Print(indent + '\t') for subplan in self.subplans)
+
+        return '\n'.join(plan_lines)
 
     def add_op(self, new_op: MohairOp):
         self.op_pipeline.append(new_op)
@@ -249,7 +294,7 @@ class PlanPipeline(MohairPlan):
         self.op_pipeline.extend(new_ops)
         return self
 
-@dataclass
+@dataclass(slots=True)
 class PlanBreak(MohairPlan):
     """
     Represents a holistic plan that has a list of pipelined ops that can be applied to the
@@ -264,7 +309,12 @@ class PlanBreak(MohairPlan):
     subplans : list[MohairPlan] = field(default_factory=list)
 
     def __post_init__(self):
-        self.name = '.'.join([sub_root.name for sub_root in self.subplans])
+        # a subplan's name may be None (e.g. a Read that has no read_type set)
+        if len(self.subplans) == 1:
+            self.name = self.subplans[0].name or ''
+
+        else:
+            self.name = '.'.join(sub_root.name or '' for sub_root in self.subplans)
 
     def __str__(self):
         return self.Print()
@@ -273,64 +323,133 @@ class PlanBreak(MohairPlan):
         return hash(self.plan_op) + sum([hash(subplan) for subplan in self.subplans])
 
     def Print(self, indent=''):
-        return (
-              f'{indent}PlanBreak({self.name}) <{self.plan_op}>\n'
-            + f'{indent}>> subplans:\n'
-            + '\n'.join([
-                  subplan.Print(indent + '\t')
-                  for subplan in self.subplans
-              ])
-        )
+        plan_lines = [
+             f'{indent}PlanBreak({self.name}) <{self.plan_op}>'
+            ,f'{indent}>> subplans:'
+        ]
+        plan_lines.extend(subplan.Print(indent + '\t') for subplan in self.subplans)
+
+        return '\n'.join(plan_lines)
 
 
 # ------------------------------
 # Functions
-@singledispatch
-def MohairFrom(plan_op) -> Any:
-    raise NotImplementedError(f'No implementation for operator: {plan_op}')
+def MohairFrom(plan_op, memo: dict[int, tuple[Any, MohairPlan]] = None) -> Any:
+    """
+    Translates a substrait relation (:plan_op:) into a mohair plan. Translation functions
+    are resolved from `_DISPATCH` using the exact protobuf message type of :plan_op:.
+
+    The plan tree is walked iteratively in post-order using an explicit stack, so the
+    translation itself does not consume Python stack frames per relation. Each translation
+    function receives the already translated plans of the relation's inputs. Note that
+    parsing a plan (protobuf's decoder depth limit) and `Print`/`__hash__` of the resulting
+    mohair plan still bound how deep a plan can be.
+
+    :memo: is scoped to a single translation and maps `id(plan_op)` to the translated
+    plan; the message itself is kept in each entry so that its id can not be recycled
+    while the translation is in progress.
+    """
+
+    if memo is None: memo = {}
+
+    # each frame is: (relation, translation function, unwrapped relation, inputs). The
+    # last 3 are None until the frame is expanded; an expanded frame is revisited once
+    # all of its inputs have been translated.
+    frames = [(plan_op, None, None, None)]
+    while frames:
+        rel_msg, fn_translate, op_rel, op_inputs = frames.pop()
+
+        if op_inputs is None:
+            if id(rel_msg) in memo: continue
 
-@MohairFrom.register
-def _from_rel(plan_op: Rel) -> Any:
+            fn_translate, op_rel, input_names = _resolve_translation(rel_msg)
+            op_inputs = [getattr(op_rel, input_name) for input_name in input_names]
+
+            frames.append((rel_msg, fn_translate, op_rel, op_inputs))
+            frames.extend(
+                (input_msg, None, None, None)
+                for input_msg in reversed(op_inputs)
+            )
+            continue
+
+        subplans          = [memo[id(input_msg)][1] for input_msg in op_inputs]
+        memo[id(rel_msg)] = (rel_msg, fn_translate(op_rel, subplans))
+
+    return memo[id(plan_op)][1]
+
+def _resolve_translation(plan_op) -> tuple:
     """
-    Translation function that propagates through the generic 'Rel' message.
+    Resolves the translation function, the relation to translate, and the names of its
+    input fields for :plan_op:. A generic 'Rel' message is unwrapped to the relation set
+    in its `rel_type`.
     """
 
-    op_rel = getattr(plan_op, plan_op.WhichOneof('rel_type'))
-    # return MohairFrom(op_rel, plan_op)
-    return MohairFrom(op_rel)
+    if type(plan_op) is Rel:
+        rel_type = plan_op.WhichOneof('rel_type')
+        if rel_type is None:
+            raise NotImplementedError(f'No relation set for operator: {plan_op}')
 
-# >> Translations for unary relations
-@MohairFrom.register
-def _from_filter(filter_op: FilterRel) -> Any:
-    logger.debug('translating <Filter>')
+        op_translation = _DISPATCH_BY_RELTYPE.get(rel_type)
+        if op_translation is None:
+            raise NotImplementedError(f'No implementation for relation type: {rel_type}')
 
-@MohairFrom.register
-def _from_fetch(fetch_op: FetchRel) -> Any:
-    logger.debug('translating <Fetch>')
+        return op_translation[0], getattr(plan_op, rel_type), op_translation[1]
 
-@MohairFrom.register
-def _from_sort(sort_op: SortRel) -> Any:
-    logger.debug('translating <Sort>')
+    op_translation = _DISPATCH.get(type(plan_op))
+    if op_translation is None:
+        raise NotImplementedError(f'No implementation for operator: {plan_op}')
 
-@MohairFrom.register
-def _from_project(project_op: ProjectRel) -> Any:
-    logger.debug('translating <Project>')
+    return op_translation[0], plan_op, op_translation[1]
 
-    mohair_subplan = MohairFrom(project_op.input)
-    mohair_op      = Projection(project_op)
+# >> Translations for unary relations
+def _extend_or_wrap(mohair_subplan: MohairPlan, mohair_op: MohairOp) -> MohairPlan:
+    """
+    Pipelines :mohair_op: with its input. If :mohair_subplan: is a PlanPipeline, then
+    :mohair_op: is appended to it; otherwise, a new PlanPipeline that consumes the result
+    of :mohair_subplan: is started.
+    """
 
-    if mohair_subplan is PlanPipeline:
-        logger.debug('\t>> extending pipeline')
+    # PlanPipeline is not subclassed, so an exact type check suffices
+    if type(mohair_subplan) is PlanPipeline:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('\t>> extending pipeline')
 
-        mohair_subplan.add_op(mohair_op)
-        return mohair_subplan
+        return mohair_subplan.add_op(mohair_op)
 
     return PlanPipeline([mohair_op], mohair_subplan.name, [mohair_subplan])
 
+def _from_filter(filter_op: FilterRel, subplans: list[MohairPlan]) -> Any:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('translating <Filter>')
+
+    return _extend_or_wrap(subplans[0], Selection(filter_op))
+
+def _from_fetch(fetch_op: FetchRel, subplans: list[MohairPlan]) -> Any:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('translating <Fetch>')
+
+    return _extend_or_wrap(subplans[0], Limit(fetch_op))
+
+def _from_sort(sort_op: SortRel, subplans: list[MohairPlan]) -> Any:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('translating <Sort>')
+
+    # a sort must see all of its input before producing output, so it can not be
+    # pipelined with its input
+    mohair_subplan = subplans[0]
+    mohair_op      = Sort(sort_op)
 
-@MohairFrom.register
-def _from_aggregate(aggregate_op: AggregateRel) -> Any:
-    mohair_subplan = MohairFrom(aggregate_op.input)
+    return PlanBreak(mohair_op, mohair_subplan.name, [mohair_subplan])
+
+def _from_project(project_op: ProjectRel, subplans: list[MohairPlan]) -> Any:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('translating <Project>')
+
+    return _extend_or_wrap(subplans[0], Projection(project_op))
+
+
+def _from_aggregate(aggregate_op: AggregateRel, subplans: list[MohairPlan]) -> Any:
+    mohair_subplan = subplans[0]
     mohair_op      = Aggregation(aggregate_op)
 
     return PlanBreak(mohair_op, mohair_subplan.name, [mohair_subplan])
@@ -338,22 +457,45 @@ def _from_aggregate(aggregate_op: AggregateRel) -> Any:
 
 # >> Translations for leaf relations
 
-@MohairFrom.register
-def _from_readrel(read_op: ReadRel) -> Any:
+def _from_readrel(read_op: ReadRel, subplans: list[MohairPlan]) -> Any:
     mohair_op = Read(read_op)
     return PlanPipeline([mohair_op], mohair_op.name)
 
-@MohairFrom.register
-def _from_skyrel(sky_op: SkyRel) -> Any:
+def _from_skyrel(sky_op: SkyRel, subplans: list[MohairPlan]) -> Any:
     mohair_op = SkyPartition(sky_op)
     return PlanPipeline([mohair_op], mohair_op.name)
 
 # >> Translations for join and n-ary relations
 
-@MohairFrom.register
-def _from_joinrel(join_op: JoinRel) -> Any:
-    left_subplan    = MohairFrom(join_op.left)
-    right_subplan   = MohairFrom(join_op.right)
-    mohair_op       = Join(join_op)
-
-    return PlanBreak(mohair_op, subplans=[left_subplan, right_subplan])
+def _from_joinrel(join_op: JoinRel, subplans: list[MohairPlan]) -> Any:
+    mohair_op = Join(join_op)
+
+    return PlanBreak(mohair_op, subplans=subplans)
+
+
+# >> Dispatch table
+#   |> maps a protobuf message type to its translation function and the names of the
+#   |> fields holding its inputs (in order). Lookups are on the exact type (protobuf
+#   |> message classes are not subclassed), so there is no MRO walk.
+_DISPATCH = {
+     FilterRel   : (_from_filter   , ('input',))
+    ,FetchRel    : (_from_fetch    , ('input',))
+    ,SortRel     : (_from_sort     , ('input',))
+    ,ProjectRel  : (_from_project  , ('input',))
+    ,AggregateRel: (_from_aggregate, ('input',))
+    ,ReadRel     : (_from_readrel  , ())
+    ,SkyRel      : (_from_skyrel   , ())
+    ,JoinRel     : (_from_joinrel  , ('left', 'right'))
+}
+
+#   |> maps the name of the field set in `Rel.rel_type` to an entry of `_DISPATCH`, so
+#   |> that a 'Rel' can be unwrapped using the result of `WhichOneof` alone.
+_DISPATCH_BY_RELTYPE = {
+     'filter'   : _DISPATCH[FilterRel]
+    ,'fetch'    : _DISPATCH[FetchRel]
+    ,'sort'     : _DISPATCH[SortRel]
+    ,'project'  : _DISPATCH[ProjectRel]
+    ,'aggregate': _DISPATCH[AggregateRel]
+    ,'read'     : _DISPATCH[ReadRel]
+    ,'join'     : _DISPATCH[JoinRel]
+}
@@ -31,26 +31,17 @@ The plan definition and planning portion of query processing for decomposable qu
 # >> Standard libs
 import logging
 
-from functools import singledispatch
-from dataclasses import dataclass
+from functools import lru_cache
+from dataclasses import dataclass, field
 
 # >> Third-party libs
 
+#   |> protobuf runtime (used to report which backend parses substrait messages)
+from google.protobuf.internal import api_implementation
+
 #   |> substrait types
 from mohair.substrait.plan_pb2 import Plan
 
-from mohair.substrait.algebra_pb2 import Rel
-from mohair.substrait.algebra_pb2 import ( ReadRel  , ExtensionLeafRel
-                                          
-                                          # unary relations
-                                          ,FilterRel,  FetchRel, AggregateRel, SortRel
-                                          ,ProjectRel, ExtensionSingleRel
-
-                                          # n-ary relations
-                                          ,JoinRel, SetRel, ExtensionMultiRel
-                                          ,HashJoinRel, MergeJoinRel
-                                         )
-
 # >> Internal 
 
 #   |> Logging
@@ -72,6 +63,15 @@ logger = logging.getLogger(__name__)
 logger.setLevel(default_loglevel)
 AddConsoleLogHandler(logger)
 
+# >> Protobuf backend
+#   |> every relation of a plan is parsed and accessed through protobuf, which is much
+#   |> slower with the pure-python backend than with a native one ('upb' or 'cpp')
+if api_implementation.Type() == 'python':
+    logger.warning(
+        'Using the pure-python protobuf backend; install a protobuf release with a native'
+        ' backend to speed up substrait translation'
+    )
+
 
 # ------------------------------
 # Classes
@@ -88,6 +88,7 @@ class QueryPlan:
     plan_msg      : bytes
     substrait_plan: Plan
     mohair_plan   : MohairPlan = None
+    _plan_hash    : int        = field(default=None, init=False, repr=False, compare=False)
 
 
     @classmethod
@@ -99,32 +100,57 @@ class QueryPlan:
         return MohairPlan.ToBytes(plan_hash)
 
     def __hash__(self):
-        plan_hash = hash(self.mohair_plan)
-        logger.debug(f'Hash of QueryPlan: {plan_hash}')
-        return plan_hash
+        # the mohair plan is read-only once translated, so its hash is computed only once
+        if self._plan_hash is None:
+            self._plan_hash = hash(self.mohair_plan)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'Hash of QueryPlan: {self._plan_hash}')
+
+        return self._plan_hash
 
 
 # ------------------------------
 # Functions (translation)
 
-def TranslateSubstrait(substrait_msg: bytes) -> QueryPlan:
+@lru_cache(maxsize=128)
+def _translate_plan(substrait_msg: bytes) -> tuple[Plan, MohairPlan]:
+    """
+    Parses and translates :substrait_msg: into a substrait plan and a mohair plan. The
+    operators of the mohair plan wrap relation messages of the returned substrait plan.
+    Results are cached (LRU) on the message bytes, so both plans are shared and must be
+    treated as read-only.
+    """
+
     substrait_plan = Plan()
     substrait_plan.ParseFromString(substrait_msg)
 
-    mohair_plan = None
-    for plan_ndx, plan_root in enumerate(substrait_plan.relations):
-        logger.debug(f'translating plan {plan_ndx}')
+    # memoized translations, scoped to this plan
+    translation_memo = {}
+
+    # A query plan should have exactly 1 `root`, even if it has many trees
+    plan_roots = [
+        plan_rel.root
+        for plan_rel in substrait_plan.relations
+        if plan_rel.HasField('root')
+    ]
+    assert len(plan_roots) == 1
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'translating root of {len(substrait_plan.relations)} relation(s)')
 
-        if plan_root.HasField('root'):
-            # A query plan should have only 1 `root`, even if it has many trees
-            assert mohair_plan == None
+    return substrait_plan, MohairFrom(plan_roots[0].input, translation_memo)
 
-            mohair_plan = MohairFrom(plan_root.root.input)
+def TranslateSubstrait(substrait_msg: bytes) -> QueryPlan:
+    """
+    Translates :substrait_msg: into a QueryPlan. Repeated submissions of the same message
+    reuse the cached substrait and mohair plans (see `_translate_plan`); only the
+    QueryPlan is new.
+    """
 
-    # Very confusing if a query plan did not have any `root`
-    assert mohair_plan is not None
+    substrait_plan, mohair_plan = _translate_plan(substrait_msg)
 
-    return QueryPlan(substrait_msg, Plan(), mohair_plan)
+    return QueryPlan(substrait_msg, substrait_plan, mohair_plan)
 
 
 # ------------------------------